@@ -0,0 +1,35 @@
+import random
+import time
+
+# maximum sleep between two attempts, in seconds
+MAX_BACKOFF = 30
+
+
+def backoff_delay(retry, deadline, max_retry):
+    """
+    Function to compute the sleep before a new attempt (full jitter exponential backoff)
+    Input :
+        retry : number of the attempt which failed
+        deadline : time.monotonic() value after which no attempt is made
+        max_retry : maximum number of new attempts
+    Output :
+        delay : time to sleep in seconds, None if no new attempt can be made
+    """
+    now = time.monotonic()
+    if retry >= max_retry or now >= deadline:
+        return None
+    return min(random.uniform(0, min(MAX_BACKOFF, 2 ** retry)), deadline - now)
+
+
+def backoff(retry, deadline, max_retry):
+    """
+    Function to sleep before a new attempt (full jitter exponential backoff)
+    Input : see backoff_delay
+    Output :
+        True if a new attempt can be made, False otherwise
+    """
+    delay = backoff_delay(retry, deadline, max_retry)
+    if delay is None:
+        return False
+    time.sleep(delay)
+    return True
@@ -1,25 +1,303 @@
 import os, sys
+import asyncio
 import time
 import json
+import functools
+import itertools
+import random
+import contextlib
+import gzip
+import tempfile
+import uuid
 from google.cloud import bigquery, logging
 from google.cloud.bigquery.schema import SchemaField
 from google.cloud.exceptions import Conflict
-import uuid
 import concurrent.futures
-from datetime import datetime, timedelta
-from pytz import timezone
+from datetime import datetime, timedelta, timezone
+from etlgcp.backoff import backoff
+from etlgcp.pool import HTTP_POOL_SIZE, mount_http_pool
+
+try:
+    # optional, reads tables through the BigQuery Storage API (gRPC)
+    import pyarrow
+    from google.cloud import bigquery_storage
+except ImportError:
+    bigquery_storage = None
+
+MAX_RETRY = 3
+MAX_URIS_PER_JOB = 10000
+# payloads smaller than this are streamed instead of loaded by a job (insert_rows)
+MAX_STREAMING_BYTES = 10 * 1000 * 1000
+# limits of one insertAll request, well under the API ones (50000 rows, 10 MB with the row wrappers)
+MAX_STREAMING_REQUEST_ROWS = 500
+MAX_STREAMING_REQUEST_BYTES = 5 * 1000 * 1000
+COPY_BUFFER_SIZE = 1024 * 1024
+# fast compression level, the upload is network bound
+GZIP_LEVEL = 1
+# BigQuery limit for gzip compressed CSV/JSON files
+GZIP_MAX_SIZE = 4 * 1024 * 1024 * 1024
+# queries are truncated in the logs
+MAX_LOGGED_QUERY = 2048
+# order of the GCP logging severities
+_SEVERITY_RANKS = {"DEBUG": 100, "INFO": 200, "WARNING": 400, "ERROR": 500, "CRITICAL": 600}
+
+
+# counter of the job ids, started at a random value so that processes do not collide
+_job_counter = itertools.count(random.getrandbits(32))
+
+
+def _job_id(dataset_name, table_name, kind):
+    """
+    Function to build a unique job id, sortable by creation time
+    Input :
+        dataset_name : name of the dataset
+        table_name : name of the table
+        kind : kind of job (loadFile / fromQuery / extractTable)
+    Output :
+        job_id : dataset_table_kind-milliseconds-pid-counter (hexadecimal)
+    """
+    return "%s_%s_%s-%x-%x-%x" % (
+        dataset_name,
+        table_name,
+        kind,
+        int(time.time() * 1000),
+        os.getpid(),
+        next(_job_counter),
+    )
+
+
+def _truncate(query):
+    """
+    Function to shorten a query written in the logs
+    """
+    if len(query) <= MAX_LOGGED_QUERY:
+        return query
+    return query[:MAX_LOGGED_QUERY] + "..."
+
+
+def _open_local_files(file_paths, leading_rows=0, compress=False):
+    """
+    Function to open local files as a single binary stream
+    Input :
+        file_paths : local paths of the files, text files when more than one or compressed
+        leading_rows : number of leading rows skipped in every file but the first one
+        compress : True to gzip the content on the fly
+    Output :
+        the opened file, or a temporary file with the concatenated (compressed) content
+        (opened in rb+ mode, load_table_from_file rejects the w+b mode of an in-memory spooled file)
+    """
+    if len(file_paths) == 1 and not compress:
+        return open(file_paths[0], "rb")
+    stream = tempfile.TemporaryFile()
+    with (
+        gzip.GzipFile(fileobj=stream, mode="wb", compresslevel=GZIP_LEVEL)
+        if compress
+        else contextlib.nullcontext(stream)
+    ) as writer:
+        for i, file_path in enumerate(file_paths):
+            with open(file_path, "rb") as source_file:
+                if i:
+                    for _ in range(leading_rows):
+                        source_file.readline()
+                data = b""
+                for data in iter(lambda: source_file.read(COPY_BUFFER_SIZE), b""):
+                    writer.write(data)
+            # each file must start on a new line
+            if data[-1:] not in (b"", b"\n"):
+                writer.write(b"\n")
+    stream.seek(0)
+    return stream
+
+
+def _configure_csv(job_config, schema_bq, field_delimiter, quote_character, leading_rows):
+    job_config.source_format = "text/csv"
+    job_config.field_delimiter = field_delimiter
+    job_config.quote_character = quote_character
+    job_config.skip_leading_rows = leading_rows
+    job_config.schema = schema_bq
+
+
+def _configure_json(job_config, schema_bq, field_delimiter, quote_character, leading_rows):
+    job_config.source_format = "NEWLINE_DELIMITED_JSON"
+    job_config.schema = schema_bq
+
+
+def _configure_parquet(job_config, schema_bq, field_delimiter, quote_character, leading_rows):
+    job_config.source_format = "PARQUET"
+
+
+# load job configuration of each input format
+_FORMAT_CONFIGURATORS = {
+    "CSV": _configure_csv,
+    "JSON": _configure_json,
+    "NEWLINE_DELIMITED_JSON": _configure_json,
+    "PARQUET": _configure_parquet,
+}
+# formats of the files which can be concatenated and compressed
+_TEXT_FORMATS = ("CSV", "JSON", "NEWLINE_DELIMITED_JSON")
+
+
+def _format_configurator(format_input):
+    """
+    Function to get the load job configurator of an input format
+    Input :
+        format_input : format of the input file (CSV / JSON / NEWLINE_DELIMITED_JSON / PARQUET)
+    Output :
+        function setting the format options of a LoadJobConfig
+    Raise :
+        ValueError if the format is unknown
+    """
+    try:
+        return _FORMAT_CONFIGURATORS[format_input]
+    except KeyError:
+        raise ValueError(f"Unknown input format {format_input}") from None
+
+
+# kind of the schema dict values, anything else is an unusual value
+_SCHEMA_KINDS = {str: "field", dict: "record"}
+
 
-class Etlbq(bigquery.Client):
+def _schema_items(schema_dict, mode_fields):
+    """
+    Function to iterate over a schema dict as (name, value, mode), list values are repeated fields
+    """
+    for k, v in schema_dict.items():
+        if type(v) is list:
+            for val in v:
+                yield k, val, "REPEATED"
+        else:
+            yield k, v, mode_fields if type(v) is str else "NULLABLE"
+
+
+def _schema_from_dict(schema_dict, mode_fields):
+    """
+    Function to build a GBQ schema from a dictionnary, nested records are walked with an explicit stack
+    Input :
+        schema_dict : a dictionnary of the schema (see Etlbq.build_schema_from_dict)
+        mode_fields : mode of the fields
+    Output : tuple
+        schema_bq : tuple of the GBQ schema fields
+        unusual : tuple of the values ignored in the schema
+    """
+    root = []
+    unusual = []
+    # a frame is (remaining items, fields built, (parent fields, name, mode) of the record)
+    stack = [(_schema_items(schema_dict, mode_fields), root, None)]
+    while stack:
+        items, fields, parent = stack[-1]
+        for name, value, mode in items:
+            kind = _SCHEMA_KINDS.get(type(value))
+            if kind == "field":
+                fields.append(bigquery.SchemaField(name, value, mode))
+            elif kind == "record":
+                stack.append((_schema_items(value, mode_fields), [], (fields, name, mode)))
+                break
+            else:
+                unusual.append(value)
+        else:
+            stack.pop()
+            if parent is not None:
+                parent_fields, name, mode = parent
+                parent_fields.append(
+                    bigquery.SchemaField(name, "RECORD", mode, fields=tuple(fields))
+                )
+    return tuple(root), tuple(unusual)
+
+
+@functools.lru_cache(maxsize=256)
+def _schema_from_list(schema_list, mode_fields):
+    """
+    Function to build a GBQ schema from a tuple of tuples, cached for repeated builds
+    Input :
+        schema_list : tuple of tuples (name, type) or (name, type, mode) if mode_fields is None
+        mode_fields : mode of all the fields, None for individual field mode
+    Output :
+        schema_bq : tuple of the GBQ schema fields
+    """
+    if mode_fields is None:
+        return tuple(bigquery.SchemaField(n, t, mode=m) for n, t, m in schema_list)
+    return tuple(bigquery.SchemaField(f[0], f[1], mode=mode_fields) for f in schema_list)
+
+
+@functools.lru_cache(maxsize=256)
+def _schema_from_json(schema_json, mode_fields):
+    """
+    Function to build a GBQ schema from a dictionnary serialized in json, cached for repeated builds
+    """
+    return _schema_from_dict(json.loads(schema_json), mode_fields)
+
+
+class Etlbq:
     """ Class to manage bq etl primitive transformations
+    The GBQ client can be given to share it (and its connections) between several instances
     """
 
-    def __init__(self, project_id, logger, labels={},timeout=180):
-        super().__init__(project=project_id)
+    def __init__(
+        self,
+        project_id,
+        logger,
+        labels=None,
+        timeout=180,
+        max_workers=16,
+        client=None,
+    ):
+        # a given client is shared as is, its BigQuery Storage read client is built by to_arrow
+        self._shared_client = client is not None
+        if client is None:
+            client = bigquery.Client(project=project_id)
+            # the pool is sized on max_workers so that run_parallel threads do not wait for a free connection
+            mount_http_pool(client, max(HTTP_POOL_SIZE, max_workers))
+        self.client = client
         self.logger = logger
-        self.labels = labels
+        self.labels = {} if labels is None else labels
         self.timeout = timeout
+        self.max_workers = max_workers
+        # maximum time spent in the attempts of one call, in seconds
+        self.max_retry_elapsed = 120
+        # logs with a lower severity are skipped before being formatted
+        self.log_severity = "DEBUG"
+        self._table_refs = {}
+        self._read_client = None
 
-    def createwait_table(self, dataset_name, table_name, schema_bq, expiration=None, retry=0):
+    def __getattr__(self, name):
+        # bigquery.Client functions stay available on Etlbq (it used to inherit from it)
+        if name == "client":
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    def _log(self, severity, fmt, *args):
+        """
+        Function to log a text, formatted only if its severity is not filtered by self.log_severity
+        Input :
+            severity : severity of the log (DEBUG / INFO / WARNING / ERROR)
+            fmt : text of the log, with %s for the args
+            args : values inserted in the text
+        """
+        if _SEVERITY_RANKS.get(severity, 0) < _SEVERITY_RANKS.get(self.log_severity, 0):
+            return
+        self.logger.log_text(
+            text=fmt % args if args else fmt, severity=severity, labels=self.labels
+        )
+
+    def _tref(self, dataset_name, table_name):
+        """
+        Function to get the (cached) reference of a table of the project
+        Input :
+            dataset_name : name of the dataset
+            table_name : name of the table
+        Output :
+            table_ref : the GBQ table reference
+        """
+        key = (dataset_name, table_name)
+        table_ref = self._table_refs.get(key)
+        if table_ref is None:
+            table_ref = bigquery.TableReference.from_string(
+                f"{self.client.project}.{dataset_name}.{table_name}"
+            )
+            self._table_refs[key] = table_ref
+        return table_ref
+
+    def createwait_table(self, dataset_name, table_name, schema_bq, expiration=None, retry=0, _deadline=None):
         """
         Function to create a table in a specific dataset on Google Big Query
         Input :
@@ -29,51 +307,40 @@ class Etlbq(bigquery.Client):
         Output :
             True if the table has been created, False otherwise
         """
+        if _deadline is None:
+            _deadline = time.monotonic() + self.max_retry_elapsed
         try:
-            dataset_ref = self.dataset(dataset_name)
-            table_ref = dataset_ref.table(table_name)
+            table_ref = self._tref(dataset_name, table_name)
             # Creation of the table
             bigquery_table = bigquery.Table(table_ref, schema_bq)
             if expiration:
-                bigquery_table.expires = datetime.now(timezone("UTC")) + timedelta(seconds=expiration)
-            self.create_table(table=bigquery_table)
-            tableExist = False
-            while not tableExist:
-                try:
-                    self.get_table(table_ref)
-                    tableExist = True
-                except:
-                    time.sleep(5)
-                    tableExist = False
-            self.logger.log_text(
-                text=f"Table {table_name} created in BQ",
-                severity="INFO",
-                labels=self.labels,
-            )
+                bigquery_table.expires = datetime.now(timezone.utc) + timedelta(seconds=expiration)
+            # create_table returns once the table exists server side
+            self.client.create_table(table=bigquery_table)
+            self._log("INFO", "Table %s created in BQ", table_name)
             return True
         except Conflict:
-            self.logger.log_text(
-                text=f"Table {table_name} already exists in BQ",
-                severity="INFO",
-                labels=self.labels,
-            )
+            self._log("INFO", "Table %s already exists in BQ", table_name)
             return True
         except Exception as e:
-            if retry < 3:
-                self.logger.log_text(
-                    text=f"Error in create table : {dataset_name} {table_name}. Attempt {retry + 1}",
-                    severity="WARNING",
-                    labels=self.labels,
+            if backoff(retry, _deadline, MAX_RETRY):
+                self._log(
+                    "WARNING",
+                    "Error in create table : %s %s. Attempt %s",
+                    dataset_name,
+                    table_name,
+                    retry + 1,
                 )
-                time.sleep(5)
                 return self.createwait_table(
-                    dataset_name, table_name, schema_bq, retry=retry + 1
+                    dataset_name, table_name, schema_bq, expiration, retry=retry + 1, _deadline=_deadline
                 )
             else:
-                self.logger.log_text(
-                    text=f"Error in create table : {dataset_name} {table_name} : {e}. Max number of attempts exceeded",
-                    severity="ERROR",
-                    labels=self.labels,
+                self._log(
+                    "ERROR",
+                    "Error in create table : %s %s : %s. Max number of attempts or retry time exceeded",
+                    dataset_name,
+                    table_name,
+                    e,
                 )
                 return False
 
@@ -88,24 +355,13 @@ class Etlbq(bigquery.Client):
         """
         schema_bq = []
         try:
-            schema_bq = [
-                bigquery.SchemaField(
-                    field[0],
-                    field[1],
-                    mode=field[2] if mode_fields is None else mode_fields,
-                )
-                for field in schema_list
-            ]
-            self.logger.log_text(
-                text="BQ schema build from list", severity="INFO", labels=self.labels
+            schema_bq = list(
+                _schema_from_list(tuple(map(tuple, schema_list)), mode_fields)
             )
+            self._log("INFO", "BQ schema build from list")
             return schema_bq
         except Exception as e:
-            self.logger.log_text(
-                text=f"Error in build schema from list :: error {e}",
-                severity="ERROR",
-                labels=self.labels,
-            )
+            self._log("ERROR", "Error in build schema from list :: error %s", e)
             return schema_bq
 
     def build_schema_from_dict(self, schema_dict, mode_fields="NULLABLE"):
@@ -119,50 +375,207 @@ class Etlbq(bigquery.Client):
         """
         schema_bq = []
         try:
-            for k, v in schema_dict.items():
-                if isinstance(v, str) or isinstance(v, unicode):
-                    schema_bq.append(bigquery.SchemaField(k, v, mode_fields))
-                elif isinstance(v, dict):
-                    schema_bq.append(
-                        bigquery.SchemaField(
-                            k,
-                            "RECORD",
-                            fields=self.build_schema_from_dict(v, mode_fields),
-                        )
-                    )
-                elif isinstance(v, list):
-                    for val in v:
-                        if isinstance(val, str) or isinstance(val, unicode):
-                            schema_bq.append(
-                                bigquery.SchemaField(k, val, "REPEATED", fields=())
-                            )
-                        else:
-                            schema_bq.append(
-                                bigquery.SchemaField(
-                                    k,
-                                    "RECORD",
-                                    "REPEATED",
-                                    fields=self.build_schema_from_dict(v, mode_fields),
-                                )
-                            )
-                else:
-                    self.logger.log_text(
-                        text=f"Unusual value used in schema {v} :: type {type(v)}",
-                        severity="ERROR",
-                        labels=self.labels,
-                    )
-            self.logger.log_text(
-                text="BQ schema build from dict", severity="INFO", labels=self.labels
-            )
+            try:
+                schema_bq, unusual = _schema_from_json(json.dumps(schema_dict), mode_fields)
+            except TypeError:
+                # not serializable, so not cacheable
+                schema_bq, unusual = _schema_from_dict(schema_dict, mode_fields)
+            schema_bq = list(schema_bq)
+            for v in unusual:
+                self._log(
+                    "ERROR",
+                    "Unusual value used in schema %s :: type %s",
+                    v,
+                    type(v),
+                )
+            self._log("INFO", "BQ schema build from dict")
             return schema_bq
         except Exception as e:
-            self.logger.log_text(
-                text=f"Error in build BQ schema from dict :: error {e}",
-                severity="ERROR",
-                labels=self.labels,
-            )
+            self._log("ERROR", "Error in build BQ schema from dict :: error %s", e)
             return schema_bq
 
+    def submit_loadjob(
+        self,
+        file_paths,
+        dataset_name,
+        table_name,
+        schema_bq,
+        format_input,
+        write_disposition="WRITE_EMPTY",
+        field_delimiter=",",
+        quote_character='"',
+        leading_rows=0,
+        max_bad_records=0,
+        compress_upload=True,
+    ):
+        """
+        Function to start a load job without waiting for its completion
+        Input :
+            file_paths : list of gs paths, or list of local paths (concatenated when more than one)
+            other arguments : see insert_files
+        Output :
+            job : the started load job, to be waited with wait_jobs
+        """
+        job_id = _job_id(dataset_name, table_name, "loadFile")
+        table_ref = self._tref(dataset_name, table_name)
+        job_config = bigquery.LoadJobConfig()
+        job_config.write_disposition = write_disposition
+        _format_configurator(format_input)(
+            job_config, schema_bq, field_delimiter, quote_character, leading_rows
+        )
+        job_config.max_bad_records = max_bad_records
+        if file_paths[0][:3] == "gs:":
+            return self.client.load_table_from_uri(
+                file_paths, table_ref, job_id=job_id, job_config=job_config
+            )
+        # local text files are sent gzipped, already gzipped files are sent as is
+        compress = (
+            compress_upload
+            and format_input in _TEXT_FORMATS
+            and not any(p.endswith(".gz") for p in file_paths)
+            and sum(os.path.getsize(p) for p in file_paths) <= GZIP_MAX_SIZE
+        )
+        with _open_local_files(file_paths, leading_rows, compress) as source_file:
+            return self.client.load_table_from_file(
+                source_file,
+                table_ref,
+                job_id=job_id,
+                job_config=job_config,
+                rewind=True,
+            )
+
+    def insert_files(
+        self,
+        file_paths,
+        dataset_name,
+        table_name,
+        schema_bq,
+        format_input,
+        write_disposition="WRITE_EMPTY",
+        field_delimiter=",",
+        quote_character='"',
+        leading_rows=0,
+        max_bad_records=0,
+        compress_upload=True,
+        retry=0,
+        _deadline=None,
+        _results=None,
+    ):
+        """
+        Function to load several files into a GBQ table with as few load jobs as possible
+        gs files are loaded in one job (up to MAX_URIS_PER_JOB uris), local CSV/JSON files are
+        concatenated in one job, local PARQUET and .gz files are loaded one job per file
+        Input :
+            file_paths : list of local or gs paths to the files to load
+            dataset_name : name of the dataset
+            table_name : name of the table to load on GBQ
+            schema_bq : GBQ schema of the data
+            write_disposition : the way of inserting data (WRITE_APPEND / WRITE_EMPTY / WRITE_TRUNCATE),
+                applied to the first job, the following ones append
+            format_input : format of the input files (CSV / JSON / NEWLINE_DELIMITED_JSON / PARQUET)
+            field_delimiter : field delimiter
+            quote_character : character used to quote
+            leading_rows : number of leading rows in each file (usually one for the header)
+            max_bad_records : maximum number of errors to consider
+            compress_upload : True to gzip local CSV/JSON files during the upload
+        Output : list of tuples, one per load job done (the jobs of the files not loaded are missing)
+            job_id : the job id
+            errors : the errors during the job execution, None if no error
+        Raise :
+            ValueError if the format is unknown
+        """
+        _format_configurator(format_input)
+        if _deadline is None:
+            _deadline = time.monotonic() + self.max_retry_elapsed
+        # results of the jobs done by the previous attempts
+        results = list(_results or [])
+        gs_paths = [p for p in file_paths if p[:3] == "gs:"]
+        local_paths = [p for p in file_paths if p[:3] != "gs:"]
+        sources = [
+            gs_paths[i : i + MAX_URIS_PER_JOB]
+            for i in range(0, len(gs_paths), MAX_URIS_PER_JOB)
+        ]
+        if format_input in _TEXT_FORMATS:
+            text_paths = [p for p in local_paths if not p.endswith(".gz")]
+            sources += [text_paths] if text_paths else []
+            sources += [[p] for p in local_paths if p.endswith(".gz")]
+        else:
+            sources += [[p] for p in local_paths]
+        for i, source in enumerate(sources):
+            # following jobs of the batch must not truncate or conflict with the first one
+            disposition = "WRITE_APPEND" if results else write_disposition
+            try:
+                files = source[0] if len(source) == 1 else f"{len(source)} files"
+                job = self.submit_loadjob(
+                    source,
+                    dataset_name,
+                    table_name,
+                    schema_bq,
+                    format_input,
+                    disposition,
+                    field_delimiter,
+                    quote_character,
+                    leading_rows,
+                    max_bad_records,
+                    compress_upload,
+                )
+                job_id = job.job_id
+                try:
+                    job.result(timeout=self.timeout)
+                except concurrent.futures.TimeoutError as e:
+                    self._log(
+                        "WARNING",
+                        "Insert data to bq JobId %s - Loaded rows, error waiting for complete : %s : %s",
+                        job_id,
+                        files,
+                        e,
+                    )
+                self._log(
+                    "INFO",
+                    "Insert data to bq JobId %s - Loaded rows from %s into %s.%s",
+                    job_id,
+                    files,
+                    dataset_name,
+                    table_name,
+                )
+                results.append((job_id, job.errors))
+            except Exception as e:
+                # only the sources not loaded yet are sent again
+                remaining = [p for src in sources[i:] for p in src]
+                if backoff(retry, _deadline, MAX_RETRY):
+                    self._log(
+                        "WARNING",
+                        "Error in send to BQ : %s files : %s. Retry %s",
+                        len(remaining),
+                        e,
+                        retry + 1,
+                    )
+                    return self.insert_files(
+                        remaining,
+                        dataset_name,
+                        table_name,
+                        schema_bq,
+                        format_input,
+                        write_disposition,
+                        field_delimiter,
+                        quote_character,
+                        leading_rows,
+                        max_bad_records,
+                        compress_upload,
+                        retry=retry + 1,
+                        _deadline=_deadline,
+                        _results=results,
+                    )
+                else:
+                    self._log(
+                        "ERROR",
+                        "Error in send to BQ : %s files : %s. Max number of attempts or retry time exceeded",
+                        len(remaining),
+                        e,
+                    )
+                    return results
+        return results
+
     def insert_file(
         self,
         file_path,
@@ -175,6 +588,7 @@ class Etlbq(bigquery.Client):
         quote_character='"',
         leading_rows=0,
         max_bad_records=0,
+        compress_upload=True,
         retry=0,
     ):
         """
@@ -185,90 +599,188 @@ class Etlbq(bigquery.Client):
             table_name : name of the table to load on GBQ
             schema_bq : GBQ schema of the data
             write_disposition : the way of inserting data (WRITE_APPEND / WRITE_EMPTY / WRITE_TRUNCATE)
-            format_input : format of the input file (CSV / NEWLINE_DELIMITED_JSON / PARQUET)
+            format_input : format of the input file (CSV / JSON / NEWLINE_DELIMITED_JSON / PARQUET)
             field_delimiter : field delimiter
             quote_character : character used to quote
             leading_rows : number of leading rows (usually one for the header)
             max_bad_records : maximum number of errors to consider
+            compress_upload : True to gzip a local CSV/JSON file during the upload
+            retry : number of attempts already made
         Output : tuple
             job_id : the job id
             errors : the errors during the job execution, None if no error
+        Raise :
+            ValueError if the format is unknown
+        """
+        results = self.insert_files(
+            [file_path],
+            dataset_name,
+            table_name,
+            schema_bq,
+            format_input,
+            write_disposition,
+            field_delimiter,
+            quote_character,
+            leading_rows,
+            max_bad_records,
+            compress_upload,
+            retry=retry,
+        )
+        return results[0] if results else (None, None)
+
+    def insert_rows(
+        self,
+        rows,
+        dataset_name,
+        table_name,
+        schema_bq=None,
+        max_streaming_bytes=MAX_STREAMING_BYTES,
+        retry=0,
+        _deadline=None,
+        _row_ids=None,
+    ):
         """
+        Function to append rows into a GBQ table
+        Small payloads are streamed (tabledata.insertAll, no job latency, the table must exist)
+        in requests of MAX_STREAMING_REQUEST_ROWS rows at most, with insert ids kept across the retries
+        so that the API deduplicates the rows sent again, larger ones are sent as a NEWLINE_DELIMITED_JSON load job (cheaper for big volumes)
+        Input :
+            rows : list of dict (column name : value)
+            dataset_name : name of the dataset
+            table_name : name of the table to load on GBQ
+            schema_bq : GBQ schema of the data, used by the load job
+            max_streaming_bytes : estimated size of the rows above which a load job is used
+        Output : tuple
+            job_id : the load job id, None when the rows are streamed
+            errors : the errors during the insertion, None if no error
+        """
+        if not rows:
+            # the API rejects a request without rows
+            return (None, None)
+        if _deadline is None:
+            _deadline = time.monotonic() + self.max_retry_elapsed
         try:
-            job_id = "%s_%s_loadFile-%s" % (
-                dataset_name,
-                table_name,
-                str(uuid.uuid4()),
-            )
-            dataset_ref = self.dataset(dataset_name)
-            table_ref = dataset_ref.table(table_name)
-            job_config = bigquery.LoadJobConfig()
-            job_config.write_disposition = write_disposition
-            if format_input == "CSV":
-                job_config.source_format = "text/csv"
-                job_config.field_delimiter = field_delimiter
-                job_config.quote_character = quote_character
-                job_config.skip_leading_rows = leading_rows
-                job_config.schema = schema_bq
-            if format_input == "JSON":
-                job_config.source_format = "NEWLINE_DELIMITED_JSON"
-                job_config.schema = schema_bq
-            if format_input == "PARQUET":
-                job_config.source_format = "PARQUET"
-            job_config.max_bad_records = max_bad_records
-            if file_path[:3] == "gs:":
-                job = self.load_table_from_uri(
-                    file_path, table_ref, job_id=job_id, job_config=job_config
+            table_ref = self._tref(dataset_name, table_name)
+            sample = rows[:100]
+            row_size = len(json.dumps(sample, default=str)) // max(1, len(sample)) + 1
+            if row_size * len(rows) < max_streaming_bytes:
+                if _row_ids is None:
+                    _row_ids = [uuid.uuid4().hex for _ in rows]
+                step = max(
+                    1,
+                    min(MAX_STREAMING_REQUEST_ROWS, MAX_STREAMING_REQUEST_BYTES // row_size),
                 )
-            else:
-                with open(file_path, "rb") as source_file:
-                    job = self.load_table_from_file(
-                        source_file, table_ref, job_id=job_id, job_config=job_config
+                errors = []
+                for start in range(0, len(rows), step):
+                    chunk_errors = self.client.insert_rows_json(
+                        table_ref,
+                        rows[start : start + step],
+                        row_ids=_row_ids[start : start + step],
                     )
+                    # index of the rows in the whole list
+                    for error in chunk_errors:
+                        error["index"] += start
+                    errors += chunk_errors
+                self._log(
+                    "INFO",
+                    "Insert data to bq - Streamed %s rows into %s.%s",
+                    len(rows),
+                    dataset_name,
+                    table_name,
+                )
+                return (None, errors or None)
+            job_config = bigquery.LoadJobConfig()
+            job_config.write_disposition = "WRITE_APPEND"
+            _format_configurator("JSON")(job_config, schema_bq, None, None, 0)
+            # rb+ mode, load_table_from_file rejects the w+b mode of an in-memory spooled file
+            with tempfile.TemporaryFile() as stream:
+                with gzip.GzipFile(
+                    fileobj=stream, mode="wb", compresslevel=GZIP_LEVEL
+                ) as writer:
+                    for row in rows:
+                        writer.write(json.dumps(row, default=str).encode("utf-8"))
+                        writer.write(b"\n")
+                job = self.client.load_table_from_file(
+                    stream,
+                    table_ref,
+                    job_id=_job_id(dataset_name, table_name, "loadRows"),
+                    job_config=job_config,
+                    rewind=True,
+                )
             job_id = job.job_id
             try:
                 job.result(timeout=self.timeout)
             except concurrent.futures.TimeoutError as e:
-                self.logger.log_text(
-                    text=f"Insert data to bq JobId {job_id} - Loaded rows, error waiting for complete : {file_path} : {e}",
-                    severity="WARNING",
-                    labels=self.labels,
+                self._log(
+                    "WARNING",
+                    "Insert data to bq JobId %s - Loaded rows, error waiting for complete : %s",
+                    job_id,
+                    e,
                 )
-            self.logger.log_text(
-                text=f"Insert data to bq JobId {job_id} - Loaded rows from {file_path} into {dataset_name}.{table_name}",
-                severity="INFO",
-                labels=self.labels,
+            self._log(
+                "INFO",
+                "Insert data to bq JobId %s - Loaded %s rows into %s.%s",
+                job_id,
+                len(rows),
+                dataset_name,
+                table_name,
             )
             return (job_id, job.errors)
         except Exception as e:
-            if retry < 3:
-                self.logger.log_text(
-                    text=f"Error in send to BQ : {file_path} : {e}. Retry {retry + 1}",
-                    severity="WARNING",
-                    labels=self.labels,
+            if backoff(retry, _deadline, MAX_RETRY):
+                self._log(
+                    "WARNING",
+                    "Error in insert rows to BQ : %s.%s : %s. Retry %s",
+                    dataset_name,
+                    table_name,
+                    e,
+                    retry + 1,
                 )
-                time.sleep(5)
-                return self.insert_file(
-                    file_path,
+                return self.insert_rows(
+                    rows,
                     dataset_name,
                     table_name,
                     schema_bq,
-                    format_input,
-                    write_disposition,
-                    field_delimiter,
-                    quote_character,
-                    leading_rows,
-                    max_bad_records,
+                    max_streaming_bytes,
                     retry=retry + 1,
+                    _deadline=_deadline,
+                    _row_ids=_row_ids,
                 )
             else:
-                self.logger.log_text(
-                    text=f"Error in send to BQ : {file_path} : {e}. Max number of attempts exceeded",
-                    severity="ERROR",
-                    labels=self.labels,
+                self._log(
+                    "ERROR",
+                    "Error in insert rows to BQ : %s.%s : %s. Max number of attempts or retry time exceeded",
+                    dataset_name,
+                    table_name,
+                    e,
                 )
                 return (None, None)
 
+    def submit_queryjob(
+        self,
+        dataset_name,
+        table_name,
+        query,
+        use_legacy_sql=False,
+        write_disposition="WRITE_EMPTY",
+        allow_large_results=False,
+    ):
+        """
+        Function to start a query job without waiting for its completion
+        Input :
+            see run_queryjob
+        Output :
+            job : the started query job, to be waited with wait_jobs
+        """
+        job_id = _job_id(dataset_name, table_name, "fromQuery")
+        table = self._tref(dataset_name, table_name)
+        job_config = bigquery.QueryJobConfig()
+        job_config.destination = table
+        job_config.use_legacy_sql = use_legacy_sql
+        job_config.write_disposition = write_disposition
+        job_config.allow_large_results = allow_large_results
+        return self.client.query(job_id=job_id, query=query, job_config=job_config)
+
     def run_queryjob(
         self,
         dataset_name,
@@ -278,6 +790,7 @@ class Etlbq(bigquery.Client):
         write_disposition="WRITE_EMPTY",
         allow_large_results=False,
         retry=0,
+        _deadline=None,
     ):
         """
         Function to run a query SQL in Google Big Query
@@ -292,42 +805,46 @@ class Etlbq(bigquery.Client):
             job_id : the job id
             errors : the errors during the job execution, None if no error
         """
+        if _deadline is None:
+            _deadline = time.monotonic() + self.max_retry_elapsed
         try:
-            job_id = "%s_%s_fromQuery-%s" % (
+            job = self.submit_queryjob(
                 dataset_name,
                 table_name,
-                str(uuid.uuid4()),
+                query,
+                use_legacy_sql,
+                write_disposition,
+                allow_large_results,
             )
-            dataset = self.dataset(dataset_name)
-            table = dataset.table(table_name)
-            job_config = bigquery.QueryJobConfig()
-            job_config.destination = table
-            job_config.use_legacy_sql = use_legacy_sql
-            job_config.write_disposition = write_disposition
-            job_config.allow_large_results = allow_large_results
-            job = self.query(job_id=job_id, query=query, job_config=job_config)
+            job_id = job.job_id
             try:
                 job.result(timeout=self.timeout)
             except concurrent.futures.TimeoutError as e:
-                self.logger.log_text(
-                    text=f"Run query bq JobId {job_id} - query, error waiting for complete : {query} : {e}",
-                    severity="WARNING",
-                    labels=self.labels,
+                self._log(
+                    "WARNING",
+                    "Run query bq JobId %s - query, error waiting for complete : %s : %s",
+                    job_id,
+                    _truncate(query),
+                    e,
                 )
-            self.logger.log_text(
-                text=f"Run query bq JobId {job_id} - query : {query} into {dataset_name}.{table_name}",
-                severity="INFO",
-                labels=self.labels,
+            self._log(
+                "INFO",
+                "Run query bq JobId %s - query : %s into %s.%s",
+                job_id,
+                _truncate(query),
+                dataset_name,
+                table_name,
             )
             return (job_id, job.errors)
         except Exception as e:
-            if retry < 3:
-                self.logger.log_text(
-                    text=f"Error in query bq : {query} : {e}. Retry {retry + 1}",
-                    severity="WARNING",
-                    labels=self.labels,
+            if backoff(retry, _deadline, MAX_RETRY):
+                self._log(
+                    "WARNING",
+                    "Error in query bq : %s : %s. Retry %s",
+                    _truncate(query),
+                    e,
+                    retry + 1,
                 )
-                time.sleep(5)
                 return self.run_queryjob(
                     dataset_name,
                     table_name,
@@ -336,15 +853,45 @@ class Etlbq(bigquery.Client):
                     write_disposition,
                     allow_large_results,
                     retry + 1,
+                    _deadline,
                 )
             else:
-                self.logger.log_text(
-                    text=f"Error in query bq : {query} : {e}. Max number of attempts exceeded",
-                    severity="ERROR",
-                    labels=self.labels,
+                self._log(
+                    "ERROR",
+                    "Error in query bq : %s : %s. Max number of attempts or retry time exceeded",
+                    _truncate(query),
+                    e,
                 )
                 return (None, None)
 
+    def submit_extractjob(
+        self,
+        destination_uris,
+        dataset_name,
+        table_name,
+        compression=None,
+        destination_format="CSV",
+        field_delimiter=",",
+        print_header=True,
+    ):
+        """
+        Function to start an extract job without waiting for its completion
+        Input :
+            see run_extractjob
+        Output :
+            job : the started extract job, to be waited with wait_jobs
+        """
+        job_id = _job_id(dataset_name, table_name, "extractTable")
+        table = self._tref(dataset_name, table_name)
+        job_config = bigquery.ExtractJobConfig()
+        job_config.compression = compression
+        job_config.destination_format = destination_format
+        job_config.field_delimiter = field_delimiter
+        job_config.print_header = print_header
+        return self.client.extract_table(
+            table, destination_uris, job_id=job_id, job_config=job_config
+        )
+
     def run_extractjob(
         self,
         destination_uris,
@@ -355,6 +902,7 @@ class Etlbq(bigquery.Client):
         field_delimiter=",",
         print_header=True,
         retry=0,
+        _deadline=None,
     ):
         """
         Function to extract a table into google storage
@@ -370,44 +918,49 @@ class Etlbq(bigquery.Client):
             job_id : the job id
             errors : the errors during the job execution, None if no error
         """
+        if _deadline is None:
+            _deadline = time.monotonic() + self.max_retry_elapsed
         try:
-            job_id = "%s_%s_extractTable-%s" % (
+            job = self.submit_extractjob(
+                destination_uris,
                 dataset_name,
                 table_name,
-                str(uuid.uuid4()),
-            )
-            dataset = self.dataset(dataset_name)
-            table = dataset.table(table_name)
-            job_config = bigquery.ExtractJobConfig()
-            job_config.compression = compression
-            job_config.destination_format = destination_format
-            job_config.field_delimiter = field_delimiter
-            job_config.print_header = print_header
-            job = self.extract_table(
-                table, destination_uris, job_id=job_id, job_config=job_config
+                compression,
+                destination_format,
+                field_delimiter,
+                print_header,
             )
+            job_id = job.job_id
             try:
                 job.result(timeout=self.timeout)
             except concurrent.futures.TimeoutError as e:
-                self.logger.log_text(
-                    text=f"Extract bq table JobId {job_id} - extraction error waiting for complete : {dataset_name}.{table_name} : {e}",
-                    severity="WARNING",
-                    labels=self.labels,
+                self._log(
+                    "WARNING",
+                    "Extract bq table JobId %s - extraction error waiting for complete : %s.%s : %s",
+                    job_id,
+                    dataset_name,
+                    table_name,
+                    e,
                 )
-            self.logger.log_text(
-                text=f"Extract bq table JobId {job_id} - extraction {dataset_name}.{table_name} to {destination_uris}",
-                severity="INFO",
-                labels=self.labels,
+            self._log(
+                "INFO",
+                "Extract bq table JobId %s - extraction %s.%s to %s",
+                job_id,
+                dataset_name,
+                table_name,
+                destination_uris,
             )
             return (job_id, job.errors)
         except Exception as e:
-            if retry < 3:
-                self.logger.log_text(
-                    text=f"Error in extract bq table : {dataset_name}.{table_name} : {e}. Retry {retry + 1}",
-                    severity="WARNING",
-                    labels=self.labels,
+            if backoff(retry, _deadline, MAX_RETRY):
+                self._log(
+                    "WARNING",
+                    "Error in extract bq table : %s.%s : %s. Retry %s",
+                    dataset_name,
+                    table_name,
+                    e,
+                    retry + 1,
                 )
-                time.sleep(5)
                 return self.run_extractjob(
                     destination_uris,
                     dataset_name,
@@ -417,15 +970,146 @@ class Etlbq(bigquery.Client):
                     field_delimiter,
                     print_header,
                     retry + 1,
+                    _deadline,
                 )
             else:
-                self.logger.log_text(
-                    text=f"Error in extract bq table : {dataset_name}.{table_name} : {e}. Max number of attempts exceeded",
-                    severity="ERROR",
-                    labels=self.labels,
+                self._log(
+                    "ERROR",
+                    "Error in extract bq table : %s.%s : %s. Max number of attempts or retry time exceeded",
+                    dataset_name,
+                    table_name,
+                    e,
                 )
                 return (None, None)
 
+    def read_table(self, dataset_name, table_name, selected_fields=None):
+        """
+        Function to read the rows of a table, streamed through the BigQuery Storage API (gRPC)
+        when google-cloud-bigquery-storage and pyarrow are installed, with the REST API otherwise
+        Input :
+            dataset_name : name of the dataset
+            table_name : name of the table to read
+            selected_fields : list of the names of the columns to read, None for all
+        Output :
+            rows : list of dict (column name : value), None if an error occurred
+        """
+        try:
+            table = self.client.get_table(self._tref(dataset_name, table_name))
+            fields = None
+            if selected_fields is not None:
+                fields = [f for f in table.schema if f.name in selected_fields]
+            row_iterator = self.client.list_rows(table, selected_fields=fields)
+            if bigquery_storage is not None:
+                if self._read_client is None and not self._shared_client:
+                    # same default credentials resolution as the client built in __init__
+                    self._read_client = bigquery_storage.BigQueryReadClient()
+                # with a given client, to_arrow builds the read client from it
+                rows = row_iterator.to_arrow(
+                    bqstorage_client=self._read_client
+                ).to_pylist()
+            else:
+                rows = [dict(row.items()) for row in row_iterator]
+            self._log(
+                "INFO",
+                "Read %s rows from %s.%s",
+                len(rows),
+                dataset_name,
+                table_name,
+            )
+            return rows
+        except Exception as e:
+            self._log(
+                "ERROR", "Error in read table : %s.%s : %s", dataset_name, table_name, e
+            )
+            return None
+
+    def wait_jobs(self, jobs, timeout=None):
+        """
+        Function to wait for several started jobs, which run concurrently on the server side
+        Input :
+            jobs : list of jobs returned by the submit_* functions
+            timeout : overall time to wait for all the jobs, self.timeout if None
+        Output : list of tuples, one per job
+            job_id : the job id
+            errors : the errors during the job execution, None if no error
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        results = []
+        for job in jobs:
+            try:
+                job.result(timeout=max(0, deadline - time.monotonic()))
+            except concurrent.futures.TimeoutError as e:
+                self._log(
+                    "WARNING",
+                    "Wait bq JobId %s - error waiting for complete : %s",
+                    job.job_id,
+                    e,
+                )
+            except Exception as e:
+                self._log("ERROR", "Error in bq JobId %s : %s", job.job_id, e)
+            results.append((job.job_id, job.errors))
+        return results
+
+    async def ainsert_file(self, *args, **kwargs):
+        """
+        Function to run insert_file from an event loop, in a thread so that the loop is not blocked
+        Input / Output : see insert_file
+        """
+        return await asyncio.to_thread(self.insert_file, *args, **kwargs)
+
+    async def ainsert_files(self, *args, **kwargs):
+        """
+        Function to run insert_files from an event loop, in a thread so that the loop is not blocked
+        Input / Output : see insert_files
+        """
+        return await asyncio.to_thread(self.insert_files, *args, **kwargs)
+
+    async def arun_queryjob(self, *args, **kwargs):
+        """
+        Function to run run_queryjob from an event loop, in a thread so that the loop is not blocked
+        Input / Output : see run_queryjob
+        """
+        return await asyncio.to_thread(self.run_queryjob, *args, **kwargs)
+
+    async def arun_extractjob(self, *args, **kwargs):
+        """
+        Function to run run_extractjob from an event loop, in a thread so that the loop is not blocked
+        Input / Output : see run_extractjob
+        """
+        return await asyncio.to_thread(self.run_extractjob, *args, **kwargs)
+
+    async def await_jobs(self, jobs, timeout=None):
+        """
+        Function to wait for several started jobs from an event loop
+        Input / Output : see wait_jobs
+        """
+        return await asyncio.to_thread(self.wait_jobs, jobs, timeout)
+
+    def flush(self):
+        """
+        Function to send the pending log entries, when the logger batches them (e.g. BackgroundLogger)
+        """
+        flush = getattr(self.logger, "flush", None)
+        if flush is not None:
+            flush()
+
+    def run_parallel(self, calls, max_workers=None):
+        """
+        Function to run independent calls (mainly waiting for GBQ) concurrently in a pool of threads
+        Input :
+            calls : list of tuples (function, args, kwargs)
+                e.g. [(etlbq.insert_file, (path, "x_temp", "table", schema, "CSV"), {}), ...]
+            max_workers : number of threads, self.max_workers if None
+        Output :
+            list of the results of the calls, in the same order
+        """
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers or self.max_workers
+        ) as executor:
+            return list(
+                executor.map(lambda call: call[0](*call[1], **call[2]), calls)
+            )
+
 
 if __name__ == "__main__":
 
@@ -434,8 +1118,11 @@ if __name__ == "__main__":
     logger_name = os.environ.get("LOGGERNAME", "etlgcp")
 
     ### set the GOOGLE_APPLICATION_CREDENTIALS env var for service account authentication
+    from etlgcp.logger import BackgroundLogger
+
     logging_client = logging.Client(project=project_id)
-    logger = logging_client.logger(logger_name)
+    # log entries are sent by batches in a background thread
+    logger = BackgroundLogger(logging_client, logger_name)
     etlbq = Etlbq(project_id, logger, {"test": "myvalue"}, timeout=120)
 
     ### example
@@ -450,3 +1137,31 @@ if __name__ == "__main__":
     #     write_disposition="WRITE_TRUNCATE",
     # )
     # etlbq.run_extractjob("gs://x_temp/testlcoextract.csv","x_temp","lcotestdup")
+    # etlbq.insert_rows([{"a": "x", "c": 1}], "x_temp", "etlgcptable", schema)
+
+    ### shared client example : one client and connection pool for several instances
+    # etlbq_other = Etlbq(project_id, logger, {"test": "other"}, client=etlbq.client)
+
+    ### async example : start the jobs then wait for all of them
+    # jobs = [
+    #     etlbq.submit_queryjob("x_temp", f"etlgcptable_{i}", f"SELECT {i} AS a")
+    #     for i in range(10)
+    # ]
+    # print(etlbq.wait_jobs(jobs))
+
+    ### parallel example : independent calls run in threads
+    # etlbq.run_parallel([
+    #     (etlbq.createwait_table, ("x_temp", "etlgcptable", schema), {}),
+    #     (etlbq.createwait_table, ("x_temp", "etlgcptable2", schema), {"expiration": 3600}),
+    # ])
+
+    ### asyncio example : the calls run in threads, the event loop is not blocked
+    # async def main():
+    #     await asyncio.gather(
+    #         etlbq.arun_queryjob("x_temp", "etlgcptable", "SELECT 1 AS a"),
+    #         etlbq.arun_queryjob("x_temp", "etlgcptable2", "SELECT 2 AS a"),
+    #     )
+    # asyncio.run(main())
+
+    ### send the pending log entries before exiting
+    etlbq.flush()
@@ -0,0 +1,42 @@
+import logging
+from google.cloud.logging.handlers.transports import BackgroundThreadTransport
+
+# python logging levels of the GCP severities
+_SEVERITY_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+}
+
+
+class BackgroundLogger:
+    """ Class exposing the log_text function of a GCP logger, the entries are sent
+    by batches from a background thread instead of one request per entry
+    """
+
+    def __init__(self, logging_client, logger_name):
+        self.name = logger_name
+        self.transport = BackgroundThreadTransport(logging_client, logger_name)
+
+    def log_text(self, text, severity="DEFAULT", labels=None):
+        """
+        Function to queue a text entry
+        Input :
+            text : text of the entry
+            severity : severity of the entry (DEBUG / INFO / WARNING / ERROR / CRITICAL)
+            labels : labels of the entry
+        """
+        record = logging.LogRecord(
+            self.name, _SEVERITY_LEVELS.get(severity, logging.NOTSET), "", 0, text, None, None
+        )
+        record.levelname = severity
+        # the transport adds its own entries to the labels, a copy keeps the caller's dict untouched
+        self.transport.send(record, text, labels=dict(labels or {}))
+
+    def flush(self):
+        """
+        Function to send the queued entries
+        """
+        self.transport.flush()
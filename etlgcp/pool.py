@@ -0,0 +1,17 @@
+from requests.adapters import HTTPAdapter
+
+# connections kept alive per host (the default urllib3 pool keeps 10)
+HTTP_POOL_SIZE = 32
+
+
+def mount_http_pool(client, pool_size=HTTP_POOL_SIZE):
+    """
+    Function to keep the http connections of a GCP client alive in a pool large enough for threaded callers
+    The client is built beforehand with its own credentials resolution (ADC, emulator, anonymous ...)
+    Input :
+        client : GCP client using the http transport (bigquery.Client, storage.Client)
+        pool_size : number of connections kept per host
+    """
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    client._http.mount("http://", adapter)
+    client._http.mount("https://", adapter)
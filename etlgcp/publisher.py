@@ -1,8 +1,65 @@
 from google.cloud import pubsub_v1, logging
+from google.api_core.exceptions import AlreadyExists, NotFound
+from etlgcp.backoff import backoff_delay
+import asyncio
 import time
-import json
 
-def publish(logger, labels, publisher_client, project_id, topic_name, message, attributes = dict(), retry=0):
+MAX_RETRY = 2
+# maximum time spent in the attempts of one publish, in seconds
+MAX_RETRY_ELAPSED = 120
+PUBLISH_TIMEOUT = 60
+
+# settings to give to the PublisherClient so that messages are sent in batches
+BATCH_SETTINGS = pubsub_v1.types.BatchSettings(max_messages=1000, max_bytes=10000000, max_latency=0.05)
+
+# parameters of PublisherClient.publish, they can not be used as attribute names
+_RESERVED_ATTRIBUTES = {"topic", "data", "ordering_key", "retry", "timeout"}
+
+# topics known to exist, to skip the get_topic request on the next publish
+_known_topics = set()
+
+def _check_topic(logger, labels, publisher_client, topic_path):
+    '''
+    Function to create the topic if it does not exist yet (checked once per topic)
+    '''
+    if topic_path not in _known_topics:
+        try:
+            publisher_client.get_topic(topic=topic_path)
+            topic_request_status = "topic exists"
+        except NotFound:
+            try:
+                publisher_client.create_topic(name=topic_path)
+                topic_request_status = "topic created"
+            except AlreadyExists:
+                # created concurrently by another publisher
+                topic_request_status = "topic exists"
+        _known_topics.add(topic_path)
+        logger.log_text(text="Topic request status : {}".format(topic_request_status), severity="DEBUG", labels=labels)
+
+
+def _build_attributes(logger, labels, attributes):
+    '''
+    Function to build the attributes sent with a message (PubSub attributes are str to str)
+    '''
+    if isinstance(attributes,dict) and all(isinstance(k,str) for k in attributes):
+        reserved = _RESERVED_ATTRIBUTES.intersection(attributes)
+        if reserved:
+            logger.log_text(text="Error : attributes {} ignored in message (reserved names)".format(sorted(reserved)), severity="ERROR", labels=labels)
+        return {k: str(v) for k, v in attributes.items() if k not in _RESERVED_ATTRIBUTES}
+    logger.log_text(text="Error : attributes ignored in message (must be a dictonary with str keys)", severity="ERROR", labels=labels)
+    return {}
+
+
+def _log_publish_error(logger, labels, future):
+    '''
+    Function to log the error of a message sent in background, if any
+    '''
+    error = future.exception()
+    if error is not None:
+        logger.log_text(text="Error in publish : {}".format(error), severity="ERROR", labels=labels)
+
+
+def publish(logger, labels, publisher_client, project_id, topic_name, message, attributes = dict(), wait=False, retry=0, _deadline=None):
     '''
     Function to publish a message in PubSub topic
     Input :
@@ -13,47 +70,122 @@ def publish(logger, labels, publisher_client, project_id, topic_name, message, a
         topic_name : name of the topic where the message will be published
         message : message to publish (str)
         attributes (optionnal) : a dict with some additional data
+        wait (optionnal) : True to wait until the message is sent (at least the max_latency of the batch settings),
+            False to return once the message is queued in the batch of the client (errors are logged when they occur)
     Output :
-        True if the message has been published, False otherwise
+        True if the message has been published (queued when wait is False), False otherwise
     '''
+    if _deadline is None:
+        _deadline = time.monotonic() + MAX_RETRY_ELAPSED
     topic_path = publisher_client.topic_path(project_id,topic_name)
-    try:
-        publisher_client.get_topic(topic_path)
-        topic_request_status = "topic exists"
-    except:
-        publisher_client.create_topic(topic_path)
-        topic_request_status = "topic created"
-    logger.log_text(text="Topic request status : {}".format(topic_request_status), severity="DEBUG", labels=labels)
     data = message.encode("utf-8")
-    if isinstance(attributes,dict):
-        attrs = json.dumps(attributes)
-    else:
-        attrs=''
-        logger.log_text(text="Error : attributes ignored in message (must be a dictonary)", severity="ERROR", labels=labels)
     try:
-        publisher_client.publish(topic_path, data=data, attributes = attrs)
+        _check_topic(logger, labels, publisher_client, topic_path)
+        attrs = _build_attributes(logger, labels, attributes)
+        future = publisher_client.publish(topic_path, data=data, **attrs)
+        if wait:
+            # raises the publish error instead of dropping it
+            future.result(timeout=PUBLISH_TIMEOUT)
+        else:
+            future.add_done_callback(lambda f: _log_publish_error(logger, labels, f))
         logger.log_text(text="Message : {} published with attributes : {}".format(data,attrs), severity="INFO", labels=labels)
         return True
     except Exception as e:
         logger.log_text(text="Error in publish : {} :: retry : {}".format(e,str(retry+1)), severity="ERROR", labels=labels)
+        # the topic may have been deleted, check it again on the next attempt
+        _known_topics.discard(topic_path)
         # Should work on 2nd try
-        if retry < 2:
-            time.sleep(10)
-            return publish(logger,labels,publisher_client,project_id,topic_name,message,attributes,retry=retry+1)
+        delay = backoff_delay(retry, _deadline, MAX_RETRY)
+        if delay is not None:
+            time.sleep(delay)
+            return publish(logger,labels,publisher_client,project_id,topic_name,message,attributes,wait,retry=retry+1,_deadline=_deadline)
+        else:
+            return False
+
+
+def publish_many(logger, labels, publisher_client, project_id, topic_name, messages, attributes = dict(), timeout=PUBLISH_TIMEOUT):
+    '''
+    Function to publish several messages in PubSub topic, all messages are sent before waiting
+    so that the publisher client batches them (see BATCH_SETTINGS)
+    Input :
+        logger : GCP logger client
+        labels : labels
+        publisher_client : GCP PubSub publisher client
+        project_id : id of the GCP project
+        topic_name : name of the topic where the messages will be published
+        messages : list of messages to publish (str)
+        attributes (optionnal) : a dict with some additional data, sent with every message
+        timeout (optionnal) : overall time to wait for all the messages
+    Output :
+        list of booleans, True if the message has been published, False otherwise
+    '''
+    topic_path = publisher_client.topic_path(project_id,topic_name)
+    try:
+        _check_topic(logger, labels, publisher_client, topic_path)
+        attrs = _build_attributes(logger, labels, attributes)
+        futures = [publisher_client.publish(topic_path, data=message.encode("utf-8"), **attrs) for message in messages]
+    except Exception as e:
+        logger.log_text(text="Error in publish many : {}".format(e), severity="ERROR", labels=labels)
+        _known_topics.discard(topic_path)
+        return [False] * len(messages)
+    deadline = time.monotonic() + timeout
+    status = []
+    for future in futures:
+        try:
+            error = future.exception(timeout=max(0, deadline - time.monotonic()))
+        except Exception as e:
+            error = e
+        if error is not None:
+            logger.log_text(text="Error in publish many : {}".format(error), severity="ERROR", labels=labels)
+        status.append(error is None)
+    logger.log_text(text="{} messages published on {} in topic {}".format(sum(status),len(status),topic_name), severity="INFO", labels=labels)
+    return status
+
+
+async def apublish(logger, labels, publisher_client, project_id, topic_name, message, attributes = dict(), retry=0, _deadline=None):
+    '''
+    Function to publish a message in PubSub topic from an event loop, the publish is awaited
+    and the retries wait with asyncio.sleep instead of blocking the loop
+    Input / Output : see publish
+    '''
+    if _deadline is None:
+        _deadline = time.monotonic() + MAX_RETRY_ELAPSED
+    topic_path = publisher_client.topic_path(project_id,topic_name)
+    data = message.encode("utf-8")
+    try:
+        if topic_path not in _known_topics:
+            await asyncio.to_thread(_check_topic, logger, labels, publisher_client, topic_path)
+        attrs = _build_attributes(logger, labels, attributes)
+        future = publisher_client.publish(topic_path, data=data, **attrs)
+        await asyncio.wait_for(asyncio.wrap_future(future), PUBLISH_TIMEOUT)
+        # a GCP logger sends each entry with a blocking request, kept out of the event loop
+        await asyncio.to_thread(logger.log_text, text="Message : {} published with attributes : {}".format(data,attrs), severity="INFO", labels=labels)
+        return True
+    except Exception as e:
+        await asyncio.to_thread(logger.log_text, text="Error in publish : {} :: retry : {}".format(e,str(retry+1)), severity="ERROR", labels=labels)
+        _known_topics.discard(topic_path)
+        delay = backoff_delay(retry, _deadline, MAX_RETRY)
+        if delay is not None:
+            await asyncio.sleep(delay)
+            return await apublish(logger,labels,publisher_client,project_id,topic_name,message,attributes,retry=retry+1,_deadline=_deadline)
         else:
             return False
 
 
 if __name__ == "__main__":
-    
+
     ### vars to be define by reading a parameter file or env vars ...
     project_id = ""
     topic_name = ""
     logger_name = ""
 
     ### set the GOOGLE_APPLICATION_CREDENTIALS env var for service account authentication
-    publisher_client = pubsub_v1.PublisherClient()
+    publisher_client = pubsub_v1.PublisherClient(batch_settings=BATCH_SETTINGS)
 
     logging_client = logging.Client(project=project_id)
     logger = logging_client.logger(logger_name)
-    
+
+    ### example
+    # publish(logger, {}, publisher_client, project_id, topic_name, "message")
+    # publish_many(logger, {}, publisher_client, project_id, topic_name, ["message1", "message2"])
+    # asyncio.run(apublish(logger, {}, publisher_client, project_id, topic_name, "message"))
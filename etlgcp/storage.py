@@ -1,17 +1,89 @@
 from google.cloud import storage, logging
 from google.cloud.exceptions import NotFound
+from google.api_core.retry import Retry, if_transient_error
+import concurrent.futures
+import functools
+import itertools
 import os
-import time
+import shutil
+from etlgcp.pool import mount_http_pool
+
+try:
+    from google.cloud.storage import transfer_manager
+except ImportError:
+    transfer_manager = None
+
+# gRPC client of the storage API, for the small object requests (ETLGCP_STORAGE_TRANSPORT=grpc)
+# not shipped by the pinned google-cloud-storage 2.x, it needs a release bundling the gapic client (3.x)
+try:
+    from google.cloud import _storage_v2 as storage_v2
+except ImportError:
+    try:
+        from google.cloud import storage_v2
+    except ImportError:
+        storage_v2 = None
+
+# maximum number of operations in a GCS batch request
+BATCH_SIZE = 100
+# files smaller than this are uploaded in a single request
+SINGLE_UPLOAD_MAX_SIZE = 8 * 1024 * 1024
+# files larger than this are uploaded in parallel chunks (when transfer_manager is available)
+PARALLEL_UPLOAD_MIN_SIZE = 150 * 1024 * 1024
+# chunk size of the resumable and parallel transfers, must be a multiple of 256 KiB
+TRANSFER_CHUNK_SIZE = 32 * 1024 * 1024
+TRANSFER_WORKERS = 8
+# files larger than this are downloaded by parallel ranged requests (when transfer_manager is available)
+PARALLEL_DOWNLOAD_MIN_SIZE = 100 * 1024 * 1024
+# maximum time to wait for all the chunks of a parallel transfer, in seconds
+TRANSFER_DEADLINE = 1800
+
+# exponential backoff with jitter on the transient errors only (429, 5xx, connection errors)
+_RETRY = Retry(
+    initial=0.5, maximum=8.0, multiplier=2.0, deadline=60.0, predicate=if_transient_error
+)
 
 
 class Etlstorage(storage.Client):
     """ Class to manage storage etl primitive transformations
+    ETLGCP_STORAGE_TRANSPORT=grpc sends the exists / delete / list requests over gRPC, it needs a
+    google-cloud-storage release bundling the gapic client (3.x, not the pinned 2.x), http is used otherwise
     """
 
-    def __init__(self, project_id, logger, labels={}):
+    def __init__(self, project_id, logger, labels=None):
         super().__init__(project=project_id)
+        # the http connections are kept alive in a pool large enough for threaded callers
+        mount_http_pool(self)
         self.logger = logger
-        self.labels = labels
+        self.labels = labels if labels is not None else {}
+        # INFO entries are skipped when ETLGCP_LOG_INFO=0, warnings and errors are always logged
+        self._info = os.environ.get("ETLGCP_LOG_INFO", "1") == "1"
+        # bucket handles built locally (no request, the methods only need the name), reused across calls
+        self._bkt = functools.lru_cache(maxsize=32)(self.bucket)
+        # exists / delete / list requests over gRPC when ETLGCP_STORAGE_TRANSPORT=grpc,
+        # the uploads and downloads always use the http transport
+        self._grpc = None
+        if os.environ.get("ETLGCP_STORAGE_TRANSPORT", "http") == "grpc":
+            if storage_v2 is not None:
+                self._grpc = storage_v2.StorageClient(credentials=self._credentials)
+            else:
+                self._log(
+                    "WARNING",
+                    "gRPC storage client not installed (needs google-cloud-storage 3.x), http transport used",
+                )
+
+    def _log(self, severity, fmt, *args):
+        """
+        Function to log a text, formatted only if it is not skipped (INFO entries when self._info is False)
+        Input :
+            severity : severity of the log (INFO / WARNING / ERROR)
+            fmt : text of the log, with %s for the args
+            args : values inserted in the text
+        """
+        if severity == "INFO" and not self._info:
+            return
+        self.logger.log_text(
+            text=fmt % args if args else fmt, severity=severity, labels=self.labels
+        )
 
     @staticmethod
     def extractBucketFile(gsPath):
@@ -23,8 +95,8 @@ class Etlstorage(storage.Client):
             bucket : bucket name
             filePath : filename, with folders if presents
         """
-        bucket = gsPath.replace("gs://", "").split("/")[0]
-        filePath = gsPath[len(bucket) + 6 :]
+        rest = gsPath[5:] if gsPath.startswith("gs://") else gsPath
+        bucket, _, filePath = rest.partition("/")
         return bucket, filePath
 
     def file_exist_gs(self, gsPath):
@@ -37,75 +109,154 @@ class Etlstorage(storage.Client):
         """
         try:
             bucketName, fileName = self.extractBucketFile(gsPath)
-            bucket = self.get_bucket(bucketName)
-            stat = storage.Blob(bucket=bucket, name=fileName).exists(self)
-            self.logger.log_text(
-                text=f"File {fileName} available in bucket {bucketName} : {stat}",
-                severity="INFO",
-                labels=self.labels,
+            if self._grpc is not None:
+                try:
+                    self._grpc.get_object(
+                        request={
+                            "bucket": f"projects/_/buckets/{bucketName}",
+                            "object_": fileName,
+                        },
+                        retry=_RETRY,
+                    )
+                    stat = True
+                except NotFound:
+                    stat = False
+            else:
+                bucket = self._bkt(bucketName)
+                stat = storage.Blob(bucket=bucket, name=fileName).exists(self)
+            self._log(
+                "INFO",
+                "File %s available in bucket %s : %s",
+                fileName,
+                bucketName,
+                stat,
             )
             return stat
         except Exception as e:
-            self.logger.log_text(
-                text=f"Error in checking file {fileName} in GS : {e}",
-                severity="ERROR",
-                labels=self.labels,
-            )
+            self._log("ERROR", "Error in checking file %s in GS : %s", fileName, e)
             return False
 
-    def move_file_gs(self, gsPathIn, gsPathOut, delete=True, retry=0):
+    def _copy_blob_gs(self, gsPathIn, gsPathOut):
         """
-        Function to move a file from a bucket into another bucket/folder
+        Function to copy a file from a bucket into another bucket/folder
         Input :
             gsPathIn : full input path file
             gsPathOut : full output path file
-            delete : True if input file is deleted False otherwise
         Output :
-            True if move has been done, False otherwise
+            inputBlob : the input blob if the copy has been done, None otherwise
         """
         try:
             bucketIn, fileNameIn = self.extractBucketFile(gsPathIn)
             bucketOut, fileNameOut = self.extractBucketFile(gsPathOut)
-            inputBucket = self.get_bucket(bucketIn)
+            inputBucket = self._bkt(bucketIn)
             inputBlob = inputBucket.blob(fileNameIn)
-            outputBucket = self.get_bucket(bucketOut)
-            inputBucket.copy_blob(inputBlob, outputBucket, new_name=fileNameOut)
-            if delete:
-                inputBlob.delete()
-                self.logger.log_text(
-                    text=f"Input file {gsPathIn} deleted",
-                    severity="INFO",
-                    labels=self.labels,
-                )
-            self.logger.log_text(
-                text=f"File move GCS input {gsPathIn} :: output {gsPathOut}",
-                severity="INFO",
-                labels=self.labels,
+            outputBucket = self._bkt(bucketOut)
+            inputBucket.copy_blob(
+                inputBlob, outputBucket, new_name=fileNameOut, retry=_RETRY
             )
-            return True
+            self._log(
+                "INFO", "File copy GCS input %s :: output %s", gsPathIn, gsPathOut
+            )
+            return inputBlob
         except NotFound:
-            self.logger.log_text(
-                text=f"File not found when moving file in GS :: gsPath {gsPathIn}",
-                severity="WARNING",
-                labels=self.labels,
+            self._log(
+                "WARNING",
+                "File not found when moving file in GS :: gsPath %s",
+                gsPathIn,
             )
-            return False
+            return None
         except Exception as e:
-            if retry < 3:
-                self.logger.log_text(
-                    text=f"Error in file move GCS :: input {gsPathIn} :: retry {retry + 1}",
-                    severity="WARNING",
-                    labels=self.labels,
+            self._log("ERROR", "Error in file move GCS %s :: input %s", e, gsPathIn)
+            return None
+
+    def _delete_blobs(self, blobs):
+        """
+        Function to delete blobs with batch requests (BATCH_SIZE deletions per request)
+        Input :
+            blobs : list of the blobs to delete
+        Output :
+            list of booleans, True if the blob has been deleted, False otherwise
+        """
+        status = []
+        for i in range(0, len(blobs), BATCH_SIZE):
+            chunk = blobs[i : i + BATCH_SIZE]
+            try:
+                with self.batch(raise_exception=False) as batch:
+                    for blob in chunk:
+                        blob.delete()
+                # one response per deletion, in the same order
+                status += [200 <= r.status_code < 300 for r in batch._responses]
+            except Exception as e:
+                self._log(
+                    "ERROR",
+                    "Error in batch deletion from GS :: %s files :: %s",
+                    len(chunk),
+                    e,
                 )
-                time.sleep(3)
-                return self.move_file_gs(gsPathIn, gsPathOut, delete, retry=retry + 1)
-            else:
-                self.logger.log_text(
-                    text=f"Error in file move GCS {e} :: input {gsPathIn} :: Max number of attemps exceeded",
-                    severity="ERROR",
-                    labels=self.labels,
+                status += [False] * len(chunk)
+        return status
+
+    def move_files_gs(self, gsPathPairs, delete=True, max_workers=16):
+        """
+        Function to move several files from a bucket into another bucket/folder
+        The copies run in parallel threads, the deletions are grouped in batch requests
+        Input :
+            gsPathPairs : list of tuples (full input path file, full output path file)
+            delete : True if input files are deleted False otherwise
+            max_workers : number of threads copying the files
+        Output :
+            list of booleans, True if move has been done, False otherwise
+        """
+        if len(gsPathPairs) == 1:
+            # no thread pool nor batch request for a single file
+            return [self.move_file_gs(*gsPathPairs[0], delete=delete)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            blobs = list(executor.map(lambda pair: self._copy_blob_gs(*pair), gsPathPairs))
+        status = [blob is not None for blob in blobs]
+        if delete:
+            copied = [i for i, blob in enumerate(blobs) if blob is not None]
+            deleted = self._delete_blobs([blobs[i] for i in copied])
+            for i, stat in zip(copied, deleted):
+                status[i] = stat
+            self._log(
+                "INFO",
+                "Input files deleted from GS :: %s on %s",
+                sum(deleted),
+                len(copied),
+            )
+        self._log("INFO", "Files move GCS :: %s on %s", sum(status), len(status))
+        return status
+
+    def move_file_gs(self, gsPathIn, gsPathOut, delete=True):
+        """
+        Function to move a file from a bucket into another bucket/folder
+        Input :
+            gsPathIn : full input path file
+            gsPathOut : full output path file
+            delete : True if input file is deleted False otherwise
+        Output :
+            True if move has been done, False otherwise
+        """
+        inputBlob = self._copy_blob_gs(gsPathIn, gsPathOut)
+        if inputBlob is None:
+            return False
+        if delete:
+            try:
+                inputBlob.delete(retry=_RETRY)
+                self._log("INFO", "Input file deleted from GS :: gsPath %s", gsPathIn)
+            except NotFound:
+                self._log(
+                    "WARNING",
+                    "File not found when deleting moved file in GS :: gsPath %s",
+                    gsPathIn,
                 )
                 return False
+            except Exception as e:
+                self._log(
+                    "ERROR", "Error in deleting moved file in GS :: gsPath %s :: %s", gsPathIn, e
+                )
+                return False
+        return True
 
     def copy_file_gs(self, gsPathIn, gsPathOut):
         """
@@ -129,121 +280,286 @@ class Etlstorage(storage.Client):
         """
         try:
             bucketName, fileName = self.extractBucketFile(gsPath)
-            bucket = self.get_bucket(bucketName)
+            bucket = self._bkt(bucketName)
             inputBlob = bucket.blob(fileName)
             bucket.rename_blob(inputBlob, newName)
-            self.logger.log_text(
-                text=f"File {gsPath} renamed to {newName}",
-                severity="INFO",
-                labels=self.labels,
-            )
-            outputGsPath = "gs://" + bucketName + "/" + newName
-            return outputGsPath
+            self._log("INFO", "File %s renamed to %s", gsPath, newName)
+            return f"gs://{bucketName}/{newName}"
         except Exception as e:
-            self.logger.log_text(
-                text=f"Error in renaming file {gsPath} : {e}",
-                severity="ERROR",
-                labels=self.labels,
-            )
+            self._log("ERROR", "Error in renaming file %s : %s", gsPath, e)
             return False
 
-    def download_file_from_gs(self, gsPath, localPath, retry=0):
+    def download_file_from_gs(self, gsPath, localPath, checksum="crc32c", sliced=False):
         """
         Function to download locally a file from GCS
         Input :
             gsPath: full gs input path file
             localPath : desired local path of the file
+            checksum : integrity check of the download ("crc32c", "md5" or None to skip it)
+            sliced : True to download large files (PARALLEL_DOWNLOAD_MIN_SIZE) by parallel ranged requests,
+                at the cost of one metadata request to get the size
         Output :
             True if the file has been downloaded, False otherwise
         """
         try:
             bucketName, fileName = self.extractBucketFile(gsPath)
-            bucket = self.get_bucket(bucketName)
-            blob = bucket.get_blob(fileName)
-            blob.download_to_filename(localPath)
-            self.logger.log_text(
-                text=f"File saved locally from GS :: gsPath {localPath}",
-                severity="INFO",
-                labels=self.labels,
-            )
+            bucket = self._bkt(bucketName)
+            # built locally, a missing file raises NotFound from the download itself
+            blob = bucket.blob(fileName)
+            if sliced and transfer_manager is not None:
+                blob.reload(retry=_RETRY)
+            localDir = os.path.dirname(localPath)
+            if localDir:
+                os.makedirs(localDir, exist_ok=True)
+            if blob.size is not None and blob.size >= PARALLEL_DOWNLOAD_MIN_SIZE:
+                transfer_manager.download_chunks_concurrently(
+                    blob,
+                    localPath,
+                    chunk_size=TRANSFER_CHUNK_SIZE,
+                    # process workers would pickle the blob and its client, which fails for this subclass
+                    worker_type=transfer_manager.THREAD,
+                    max_workers=TRANSFER_WORKERS,
+                    deadline=TRANSFER_DEADLINE,
+                    download_kwargs={"retry": _RETRY},
+                    crc32c_checksum=checksum is not None,
+                )
+            else:
+                blob.download_to_filename(localPath, checksum=checksum, retry=_RETRY)
+            self._log("INFO", "File saved locally from GS :: gsPath %s", localPath)
             return True
         except NotFound:
-            self.logger.log_text(
-                text=f"File not found when downloading file from GS :: gsPath {gsPath}",
-                severity="WARNING",
-                labels=self.labels,
+            self._log(
+                "WARNING",
+                "File not found when downloading file from GS :: gsPath %s",
+                gsPath,
             )
             return False
         except Exception as e:
-            if retry < 3:
-                self.logger.log_text(
-                    text=f"Error in downloading file from GS :: localPath {localPath} :: gsPath {gsPath} :: retry {retry + 1}",
-                    severity="WARNING",
-                    labels=self.labels,
-                )
-                time.sleep(3)
-                return self.download_file_from_gs(gsPath, localPath, retry=retry + 1)
-            else:
-                self.logger.log_text(
-                    text=f"Error in downloading file from GS :: gsPath {gsPath} :: {e}. Max number of retry exceeded",
-                    severity="ERROR",
-                    labels=self.labels,
-                )
-                return False
+            self._log(
+                "ERROR",
+                "Error in downloading file from GS :: localPath %s :: gsPath %s :: %s",
+                localPath,
+                gsPath,
+                e,
+            )
+            return False
 
-    def upload_file_to_gs(self, localPath, gsPath, delete=False, retry=0):
+    def upload_file_to_gs(self, localPath, gsPath, delete=False, checksum="crc32c"):
         """
         Function to upload a file, locally stored, on GCS
         Input :
             localPath : local path of the file
             gsPath: full gs output path file
             delete : True if the file will be deleted locally after being uploaded, False otherwise
+            checksum : integrity check of the upload ("crc32c", "md5" or None to skip it)
         Output :
             True if the file has been uploaded, False otherwise
         """
         try:
             bucketName, fileName = self.extractBucketFile(gsPath)
-            bucket = self.get_bucket(bucketName)
+            bucket = self._bkt(bucketName)
             blob = bucket.blob(fileName)
-            blob.upload_from_filename(localPath)
+            size = os.path.getsize(localPath)
+            if size >= PARALLEL_UPLOAD_MIN_SIZE and transfer_manager is not None:
+                transfer_manager.upload_chunks_concurrently(
+                    localPath,
+                    blob,
+                    chunk_size=TRANSFER_CHUNK_SIZE,
+                    # process workers would pickle the client, which fails for this subclass
+                    worker_type=transfer_manager.THREAD,
+                    max_workers=TRANSFER_WORKERS,
+                    checksum=checksum,
+                    retry=_RETRY,
+                )
+            else:
+                # small files are sent in one request, without a resumable upload buffer
+                blob.chunk_size = (
+                    None if size < SINGLE_UPLOAD_MAX_SIZE else TRANSFER_CHUNK_SIZE
+                )
+                blob.upload_from_filename(localPath, checksum=checksum, retry=_RETRY)
             if delete:
                 os.remove(localPath)
-                self.logger.log_text(
-                    text=f"Local file deleted : {localPath}",
-                    severity="INFO",
-                    labels=self.labels,
-                )
-            self.logger.log_text(
-                text=f"File upload to GS :: gsPath {gsPath}",
-                severity="INFO",
-                labels=self.labels,
+                self._log("INFO", "Local file deleted : %s", localPath)
+            self._log("INFO", "File upload to GS :: gsPath %s", gsPath)
+            return True
+        except Exception as e:
+            self._log(
+                "ERROR",
+                "Error in uploading file to GS :: local_path %s :: gsPath %s :: %s",
+                localPath,
+                gsPath,
+                e,
             )
+            return False
+
+    def upload_bytes_to_gs(self, data, gsPath, checksum="crc32c"):
+        """
+        Function to upload data from memory on GCS, without writing a local file
+        Input :
+            data : bytes, or a binary file-like object read until its end
+            gsPath: full gs output path file
+            checksum : integrity check of a single request upload ("crc32c", "md5" or None to skip it)
+        Output :
+            True if the data has been uploaded, False otherwise
+        """
+        try:
+            bucketName, fileName = self.extractBucketFile(gsPath)
+            blob = self._bkt(bucketName).blob(fileName)
+            if isinstance(data, (bytes, bytearray)) and len(data) < SINGLE_UPLOAD_MAX_SIZE:
+                blob.upload_from_string(data, checksum=checksum, retry=_RETRY)
+            else:
+                # streamed by a resumable upload, TRANSFER_CHUNK_SIZE in memory at most
+                with blob.open("wb", chunk_size=TRANSFER_CHUNK_SIZE, retry=_RETRY) as f:
+                    if isinstance(data, (bytes, bytearray)):
+                        f.write(data)
+                    else:
+                        shutil.copyfileobj(data, f, length=1 << 20)
+            self._log("INFO", "Data upload to GS :: gsPath %s", gsPath)
             return True
         except Exception as e:
-            if retry < 3:
-                self.logger.log_text(
-                    text=f"Error in uploading file to GS :: local_path {localPath} :: gsPath {gsPath} :: retry {retry + 1}",
-                    severity="WARNING",
-                    labels=self.labels,
+            self._log("ERROR", "Error in uploading data to GS :: gsPath %s :: %s", gsPath, e)
+            return False
+
+    def download_bytes_from_gs(self, gsPath, checksum="crc32c"):
+        """
+        Function to download in memory a file from GCS, without writing a local file
+        Input :
+            gsPath: full gs input path file
+            checksum : integrity check of the download ("crc32c", "md5" or None to skip it)
+        Output :
+            content of the file (bytes), None if the file has not been downloaded
+        """
+        try:
+            bucketName, fileName = self.extractBucketFile(gsPath)
+            blob = self._bkt(bucketName).blob(fileName)
+            data = blob.download_as_bytes(checksum=checksum, retry=_RETRY)
+            self._log("INFO", "Data read from GS :: gsPath %s", gsPath)
+            return data
+        except NotFound:
+            self._log(
+                "WARNING",
+                "File not found when downloading data from GS :: gsPath %s",
+                gsPath,
+            )
+            return None
+        except Exception as e:
+            self._log(
+                "ERROR", "Error in downloading data from GS :: gsPath %s :: %s", gsPath, e
+            )
+            return None
+
+    def upload_many_to_gs(self, localPaths, gsFolder, workers=TRANSFER_WORKERS):
+        """
+        Function to upload several files, locally stored, in a GCS folder
+        The uploads share a thread pool and the pooled http connections
+        Input :
+            localPaths : list of local paths of the files
+            gsFolder : full gs path of the output folder, the files keep their base name
+            workers : number of threads uploading the files
+        Output :
+            list of booleans, True if the file has been uploaded, False otherwise
+        """
+        if gsFolder[-1] != "/":
+            gsFolder = gsFolder + "/"
+        bucketName, prefix = self.extractBucketFile(gsFolder)
+        bucket = self._bkt(bucketName)
+        pairs = [
+            (localPath, bucket.blob(prefix + os.path.basename(localPath)))
+            for localPath in localPaths
+        ]
+        if transfer_manager is not None:
+            results = transfer_manager.upload_many(
+                pairs,
+                max_workers=workers,
+                worker_type=transfer_manager.THREAD,
+                raise_exception=False,
+            )
+        else:
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                results = list(
+                    executor.map(lambda pair: self._transfer(pair[1].upload_from_filename, pair[0]), pairs)
                 )
-                time.sleep(3)
-                return self.upload_file_to_gs(
-                    localPath, gsPath, delete, retry=retry + 1
+        return self._transfer_status("upload", localPaths, results)
+
+    def download_many_from_gs(self, gsPaths, localDir, workers=TRANSFER_WORKERS):
+        """
+        Function to download locally several files from GCS
+        The downloads share a thread pool and the pooled http connections
+        Input :
+            gsPaths : list of full gs input path files
+            localDir : local folder of the files, the files keep their base name
+            workers : number of threads downloading the files
+        Output :
+            list of booleans, True if the file has been downloaded, False otherwise
+        """
+        os.makedirs(localDir, exist_ok=True)
+        pairs = []
+        for gsPath in gsPaths:
+            bucketName, fileName = self.extractBucketFile(gsPath)
+            pairs.append(
+                (
+                    self._bkt(bucketName).blob(fileName),
+                    os.path.join(localDir, os.path.basename(fileName)),
                 )
-            else:
-                self.logger.log_text(
-                    text=f"Error in uploading file to GS :: local_path {localPath} :: {e}",
-                    severity="ERROR",
-                    labels=self.labels,
+            )
+        if transfer_manager is not None:
+            results = transfer_manager.download_many(
+                pairs,
+                max_workers=workers,
+                worker_type=transfer_manager.THREAD,
+                raise_exception=False,
+            )
+        else:
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                results = list(
+                    executor.map(lambda pair: self._transfer(pair[0].download_to_filename, pair[1]), pairs)
                 )
-                return False
+        return self._transfer_status("download", gsPaths, results)
 
-    def list_files_from_gs(self, gsPath, recurse=False):
+    @staticmethod
+    def _transfer(function, path):
+        """
+        Function to run one transfer and return its error, like transfer_manager does
+        Input :
+            function : upload or download method of a blob
+            path : local path of the file
+        Output :
+            None if the transfer has been done, the exception otherwise
+        """
+        try:
+            function(path)
+            return None
+        except Exception as e:
+            return e
+
+    def _transfer_status(self, kind, paths, results):
+        """
+        Function to log the errors of a bulk transfer and build its status
+        Input :
+            kind : "upload" or "download"
+            paths : list of the transferred paths
+            results : list of the transfer results (None or exception)
+        Output :
+            list of booleans, True if the file has been transferred, False otherwise
+        """
+        status = []
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                self._log(
+                    "ERROR", "Error in %s of file :: %s :: %s", kind, path, result
+                )
+            status.append(not isinstance(result, Exception))
+        self._log("INFO", "Files %s GCS :: %s on %s", kind, sum(status), len(status))
+        return status
+
+    def list_files_from_gs(self, gsPath, recurse=False, parallel_prefixes=None):
         """
         Function to list the files in a GCS folder
         Input :
             gsPath: full gs path to scan
             recurse: recurse list of files if True
+            parallel_prefixes: iterable of name prefixes covering the folder (e.g. string.hexdigits
+                for hashed names), each prefix is listed in its own thread. None for one sequential listing
         Output :
             list of the files contained in the path (and child folders if recurse=True)
         """
@@ -251,36 +567,53 @@ class Etlstorage(storage.Client):
             if gsPath[-1] != "/":
                 gsPath = gsPath + "/"
             bucketName, fileName = self.extractBucketFile(gsPath)
-            bucket = self.get_bucket(bucketName)
-            if recurse:
-                allfiles = [
-                    "gs://" + bucketName + "/" + f.name
-                    for f in bucket.list_blobs(prefix=fileName, fields="items/name")
-                    if f.name[-1] != "/"
-                ]
+            bucket = self._bkt(bucketName)
+
+            def list_names(namePrefix):
+                # without recurse, the delimiter lets the API skip the child folders
+                if self._grpc is not None:
+                    objects = self._grpc.list_objects(
+                        request={
+                            "parent": f"projects/_/buckets/{bucketName}",
+                            "prefix": namePrefix,
+                            "delimiter": "" if recurse else "/",
+                            "read_mask": {"paths": ["items.name"]},
+                        },
+                        retry=_RETRY,
+                    )
+                    return [o.name for o in objects]
+                blobs = bucket.list_blobs(
+                    prefix=namePrefix,
+                    fields="items/name,nextPageToken",
+                    delimiter=None if recurse else "/",
+                )
+                return [f.name for f in blobs]
+
+            if parallel_prefixes is None:
+                names = list_names(fileName)
             else:
-                allfiles = [
-                    "gs://" + bucketName + "/" + f.name
-                    for f in bucket.list_blobs(
-                        prefix=fileName, fields="items/name", delimiter="/"
+                prefixes = [fileName + p for p in parallel_prefixes]
+                with concurrent.futures.ThreadPoolExecutor(max(1, len(prefixes))) as executor:
+                    names = itertools.chain.from_iterable(
+                        executor.map(list_names, prefixes)
                     )
-                    if f.name[-1] != "/"
-                ]
-            self.logger.log_text(
-                text=f"Listing {len(allfiles)} files from gsPath {gsPath} in recurse = {recurse} mode.",
-                severity="INFO",
-                labels=self.labels,
+            prefix = f"gs://{bucketName}/"
+            allfiles = list(prefix + name for name in names if not name.endswith("/"))
+            self._log(
+                "INFO",
+                "Listing %s files from gsPath %s in recurse = %s mode.",
+                len(allfiles),
+                gsPath,
+                recurse,
             )
             return allfiles
         except Exception as e:
-            self.logger.log_text(
-                text=f"Error in list files from GS :: gsPath {gsPath} :: {e}",
-                severity="ERROR",
-                labels=self.labels,
+            self._log(
+                "ERROR", "Error in list files from GS :: gsPath %s :: %s", gsPath, e
             )
             return None
 
-    def delete_file_from_gs(self, gsPath, retry=0):
+    def delete_file_from_gs(self, gsPath):
         """
         Function to delete a file from GCS
         Input :
@@ -290,38 +623,54 @@ class Etlstorage(storage.Client):
         """
         try:
             bucketName, fileName = self.extractBucketFile(gsPath)
-            bucket = self.get_bucket(bucketName)
-            blob = bucket.blob(fileName)
-            blob.delete()
-            self.logger.log_text(
-                text=f"File deleted from GS :: gsPath {fileName}",
-                severity="INFO",
-                labels=self.labels,
-            )
+            if self._grpc is not None:
+                self._grpc.delete_object(
+                    request={
+                        "bucket": f"projects/_/buckets/{bucketName}",
+                        "object_": fileName,
+                    },
+                    retry=_RETRY,
+                )
+            else:
+                bucket = self._bkt(bucketName)
+                blob = bucket.blob(fileName)
+                blob.delete(retry=_RETRY)
+            self._log("INFO", "File deleted from GS :: gsPath %s", fileName)
             return True
         except NotFound:
-            self.logger.log_text(
-                text=f"File not found when deleting file from GS :: gsPath {gsPath}",
-                severity="WARNING",
-                labels=self.labels,
+            self._log(
+                "WARNING",
+                "File not found when deleting file from GS :: gsPath %s",
+                gsPath,
             )
             return False
         except Exception as e:
-            if retry < 2:
-                self.logger.log_text(
-                    text=f"Error in deleting file from GS :: gsPath {gsPath} :: retry {retry + 1}",
-                    severity="WARNING",
-                    labels=self.labels,
-                )
-                time.sleep(3)
-                return self.delete_file_from_gs(gsPath, retry=retry + 1)
-            else:
-                self.logger.log_text(
-                    text=f"Error in deleting file from GS :: gsPath {gsPath} :: {e}",
-                    severity="ERROR",
-                    labels=self.labels,
-                )
-                return False
+            self._log(
+                "ERROR", "Error in deleting file from GS :: gsPath %s :: %s", gsPath, e
+            )
+            return False
+
+    def delete_files_from_gs(self, gsPaths, max_workers=8):
+        """
+        Function to delete several files from GCS
+        The deletions are grouped in batch requests (BATCH_SIZE files), sent by parallel threads
+        Input :
+            gsPaths: list of full gs paths from files to delete
+            max_workers : number of threads sending the batch requests
+        Output :
+            list of booleans, True if the file has been deleted, False otherwise (e.g. not found)
+        """
+        blobs = []
+        for gsPath in gsPaths:
+            bucketName, fileName = self.extractBucketFile(gsPath)
+            blobs.append(self._bkt(bucketName).blob(fileName))
+        chunks = [blobs[i : i + BATCH_SIZE] for i in range(0, len(blobs), BATCH_SIZE)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            status = [
+                stat for chunk in executor.map(self._delete_blobs, chunks) for stat in chunk
+            ]
+        self._log("INFO", "Files deleted from GS :: %s on %s", sum(status), len(status))
+        return status
 
 
 if __name__ == "__main__":
@@ -331,8 +680,11 @@ if __name__ == "__main__":
     logger_name = os.environ.get("LOGGERNAME", "etlgcp")
 
     ### set the GOOGLE_APPLICATION_CREDENTIALS env var for service account authentication
+    from etlgcp.logger import BackgroundLogger
+
     logging_client = logging.Client(project=project_id)
-    logger = logging_client.logger(logger_name)
+    # log entries are sent by batches in a background thread
+    logger = BackgroundLogger(logging_client, logger_name)
     etlst = Etlstorage(project_id, logger, {"test": "myvalue"})
 
     ### example
@@ -1,14 +1,30 @@
 from google.cloud import pubsub_v1, logging
+from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
+from google.api_core.exceptions import AlreadyExists, NotFound
+import concurrent.futures
+import codecs
+import os
 import time
 import json
 
+# messages leased at the same time, bounds the memory used by the pulled messages
+FLOW_CONTROL = pubsub_v1.types.FlowControl(max_messages=1000, max_bytes=100 * 1024 * 1024)
+# threads running the callback while the next messages are pulled
+CALLBACK_WORKERS = 16
+
+_decode = codecs.getdecoder("utf-8")
+# the received messages are logged only when ETLGCP_LOG_MESSAGES=1
+_LOG_MESSAGES = os.environ.get("ETLGCP_LOG_MESSAGES", "0") == "1"
+
 def example_callback(message):
     '''
     Example of callback function tu retrieve message and attributes before acking
     '''
-    attrs = dict(message.attributes)
-    text = message.data.decode('utf-8')
-    logger.log_text(text="Message read from pubsub : {}, with attributes : {}".format(text,json.dumps(attrs)), severity="DEBUG")
+    text = _decode(message.data)[0]
+    if _LOG_MESSAGES:
+        attrs = dict(message.attributes)
+        logger.log_text(text="Message read from pubsub : {}, with attributes : {}".format(text,json.dumps(attrs)), severity="DEBUG")
+    # queued in the ack manager of the subscriber, sent by batches
     message.ack()
 
 
@@ -28,14 +44,19 @@ def subscribe(logger,labels,subscriber_client,project_id,topic_name,subscription
     '''
     subscription_path = subscriber_client.subscription_path(project_id,subscription_name)
     try:
-        subscriber_client.get_subscription(subscription_path)
+        subscriber_client.get_subscription(subscription=subscription_path)
         subscription_request_status = "Subscription exists"
-    except:
-        topic_path = publisher_client.topic_path(project_id,topic_name)
-        subscriber_client.create_subscription(subscription_path,topic_path)
-        subscription_request_status = "Subscription created"
+    except NotFound:
+        topic_path = "projects/{}/topics/{}".format(project_id,topic_name)
+        try:
+            subscriber_client.create_subscription(name=subscription_path,topic=topic_path)
+            subscription_request_status = "Subscription created"
+        except AlreadyExists:
+            # created concurrently by another subscriber
+            subscription_request_status = "Subscription exists"
     logger.log_text(text="Subscription request status : {}".format(subscription_request_status), severity="DEBUG",labels=labels)
-    future = subscriber_client.subscribe(subscription_path,callback)
+    scheduler = ThreadScheduler(executor=concurrent.futures.ThreadPoolExecutor(max_workers=CALLBACK_WORKERS))
+    future = subscriber_client.subscribe(subscription_path,callback,flow_control=FLOW_CONTROL,scheduler=scheduler)
     try:
         future.result()
     except KeyboardInterrupt:
@@ -52,7 +73,6 @@ if __name__ == "__main__":
     logger_name = ""
 
     ### set the GOOGLE_APPLICATION_CREDENTIALS env var for service account authentication
-    publisher_client = pubsub_v1.PublisherClient()
     subscriber_client = pubsub_v1.SubscriberClient()
     logging_client = logging.Client(project=project_id)
     logger = logging_client.logger(logger_name)
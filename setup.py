@@ -6,10 +6,16 @@ setup(name='etlgcp',
       author='Affini-Tech',
       author_email='lco@affini-tech.com',
       packages=['etlgcp'],
+      python_requires='>=3.9',
       install_requires=[
-        'google-cloud-bigquery>=1.24.0',
-        'google-cloud-logging>=1.15.0',
-        'google-cloud-pubsub>=1.4.3',
-        'google-cloud-storage>=1.28.1'
-      ]
+        'google-cloud-bigquery>=3.17.0',
+        'google-cloud-logging>=3.9.0',
+        'google-cloud-pubsub>=2.19.0',
+        'google-cloud-storage>=2.16.0',
+        'google-crc32c>=1.5.0'
+      ],
+      extras_require={
+        'bqstorage': ['google-cloud-bigquery-storage>=2.0.0', 'pyarrow>=7.0.0'],
+        'fast': ['google-crc32c>=1.5.0', 'grpcio>=1.60']
+      }
     )